@@ -1,93 +1,205 @@
+import gc
+import os
+import glob
 import json
-import random
-import pickle
+import hashlib
+import zipfile
+import tempfile
+import contextlib
+import multiprocessing
 import numpy as np
+from functools import lru_cache
 
 import nltk
 from nltk.stem import WordNetLemmatizer #raíz de cada palabra
+from nltk.tokenize import NLTKWordTokenizer
 
 import tensorflow 
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Activation, Dropout
-from tensorflow.keras.optimizers import SGD
+from tensorflow.keras.layers import Dense, Dropout
+from tensorflow.keras.optimizers import AdamW
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras import mixed_precision
 
 lemmatizer = WordNetLemmatizer() # comvertir a 1 y 0 para que lo entienda la red neuronal
+# las palabras se repiten mucho entre patrones, se guarda cada lema ya calculado
+lemmatize = lru_cache(maxsize=None)(lemmatizer.lemmatize)
+# tokenizador de palabras creado una sola vez; los patrones son frases cortas,
+# así que no hace falta el separador de oraciones Punkt de nltk.word_tokenize
+tokenize = NLTKWordTokenizer().tokenize
 
-
-#Importamos el json
-with open('intents.json', 'r', encoding='utf-8') as file: 
-    intents = json.load(file)
-
-# archivos para las funciones
-nltk.download('punkt_tab')  
-#nltk.download('punkt')
-nltk.download('wordnet')
-nltk.download('omw-1.4')
-
-
-# definición de listas para uso
-words = []
-classes = []
-documents = []
 ignore_letters = ['?','!','¿','.',',']
 
-# Lee las categorias del json para aplicar funciones 
-for intent in intents['intents']:
-    if 'patterns' in intent:
-        for pattern in intent['patterns']:
-            word_list = nltk.word_tokenize(pattern)         # función que permite convertir mejor a 1 y 0
-            words.extend(word_list)                         # se añaden palabras que pasaron por función anterior 
-            documents.append((word_list, intent["tag"]))    # relaciona las palabras con el identificador
-            if intent["tag"] not in classes:                # si no esta en la lista de clases que se añada a la clase            
-                classes.append(intent["tag"])       
-            
-words = [lemmatizer.lemmatize(word) for word in words if word not in ignore_letters] 
-words = sorted(set(words))
-
-# Se guardan las palabras en un archivo con la libreria pickle
-pickle.dump(words, open('words.pkl', 'wb'))
-pickle.dump(classes, open('classes.pkl', 'wb'))
-
-
-# se crea lista apra entrenamiento
-training = []
-output_empty = [0] * len(classes)
-for document in documents:
-    bag = []
-    word_patterns = document[0]
-    word_patterns = [lemmatizer.lemmatize(word.lower()) for word in word_patterns]
-    for word in words:
-        bag.append(1) if word in word_patterns else bag.append(0)
-    if len(bag) != len(words):
-        print(f"Error: bag tiene longitud {len(bag)}, debería ser {len(words)}")
-    
-    output_row = list(output_empty)
-    output_row[classes.index(document[1])] = 1
-    training.append([bag, output_row])
-    
-random.shuffle(training)
-train_x = []
-train_y = []
-for bag, output_row in training:
-    train_x.append(bag)
-    train_y.append(output_row)
-
-train_x = np.array(train_x)
-train_y = np.array(train_y)
-
-# Creación del modelo apropieado
-model = Sequential()  # instancia el modelo secuencial
-model.add(Dense(128, input_shape=(len(train_x[0]),), activation='relu'))
-model.add(Dropout(0.5))
-model.add(Dense(64, activation='relu'))
-model.add(Dropout(0.5))
-model.add(Dense(len(train_y[0]), activation='softmax'))
-
-# corrige SGD optimizer
-sgd = SGD(learning_rate=0.001, decay=1e-6, momentum=0.9, nesterov=True) 
-model.compile(loss='categorical_crossentropy', optimizer=sgd, metrics=['accuracy'])
-train_process = model.fit(np.array(train_x), np.array(train_y), epochs=100, batch_size=5, verbose=1)
-
-# guarda el modelo
-model.save('chatbot_model.h5')
-print("Model trained and saved successfully!")
\ No newline at end of file
+# semilla del barajado del dataset (mismo orden de lotes entre ejecuciones)
+SEED = 42
+
+# versión del preprocesamiento (tokenizador, ignore_letters, lematización);
+# se incrementa al cambiarlo para que no se reutilicen matrices cacheadas viejas
+PREPROCESS_VERSION = 1
+
+# por debajo de este número de patrones no compensa arrancar procesos
+MIN_PATTERNS_POOL = 5000
+
+
+# descarga un recurso de nltk solo si no está ya instalado
+def ensure_nltk_data(package, path):
+    try:
+        nltk.data.find(path)
+    except LookupError:
+        nltk.download(package, quiet=True)
+
+
+def _init_worker():
+    # cada proceso carga WordNet una sola vez antes de recibir patrones
+    nltk.corpus.wordnet.ensure_loaded()
+
+
+def procesar_patron(item):
+    """Tokeniza y lematiza un patrón, devolviendo (lemas, tag)"""
+    pattern, tag = item
+    word_list = tokenize(pattern.lower())           # función que permite convertir mejor a 1 y 0
+    return [lemmatize(word) for word in word_list if word not in ignore_letters], tag
+
+
+def construir_datos(intents):
+    """Tokeniza los intents y devuelve (words, classes, train_x, train_y)"""
+    # archivos para las funciones (solo se descargan si no están ya instalados)
+    ensure_nltk_data('wordnet', 'corpora/wordnet')
+    ensure_nltk_data('omw-1.4', 'corpora/omw-1.4')
+
+    # Lee las categorias del json para aplicar funciones 
+    patterns = [(pattern, intent["tag"])
+                for intent in intents['intents'] if 'patterns' in intent
+                for pattern in intent['patterns']]
+
+    # cada patrón es independiente: con muchos patrones se reparten entre núcleos
+    # (imap conserva el orden de los patrones, así la caché no depende de los procesos)
+    if len(patterns) >= MIN_PATTERNS_POOL:
+        with multiprocessing.Pool(max(1, (os.cpu_count() or 2) - 1), initializer=_init_worker) as pool:
+            documents = list(pool.imap(procesar_patron, patterns, chunksize=64))
+    else:
+        documents = [procesar_patron(item) for item in patterns]
+
+    # documents relaciona los lemas de cada patrón con su identificador
+    words = sorted({word for word_patterns, _ in documents for word in word_patterns})
+    classes = sorted({tag for _, tag in documents})
+
+    # se crea la matriz de entrenamiento directamente (sin lista de listas)
+    word_to_idx = {w: i for i, w in enumerate(words)}
+    class_to_idx = {c: i for i, c in enumerate(classes)}
+    train_x = np.zeros((len(documents), len(words)), dtype=np.uint8)
+    # etiquetas como índice de clase (sin one-hot) para sparse_categorical_crossentropy
+    train_y = np.fromiter((class_to_idx[tag] for _, tag in documents), dtype=np.int32, count=len(documents))
+    # índices int32 de cada lema y la fila (documento) a la que pertenece
+    columnas = np.fromiter((word_to_idx[word] for word_patterns, _ in documents for word in word_patterns),
+                           dtype=np.int32)
+    filas = np.repeat(np.arange(len(documents)), [len(word_patterns) for word_patterns, _ in documents])
+    train_x[filas, columnas] = 1  # una sola escritura dispersa para toda la matriz
+    return words, classes, train_x, train_y
+
+
+def cargar_cache(cache):
+    """Devuelve (words, classes, train_x, train_y) de la caché, o None si no existe o está dañada"""
+    if not os.path.exists(cache):
+        return None
+    try:
+        with np.load(cache) as data:
+            return data['words'].tolist(), data['classes'].tolist(), data['x'], data['y']
+    except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+        # archivo a medias (ejecución interrumpida, disco lleno): se trata como
+        # si no existiera y se reconstruye
+        with contextlib.suppress(OSError):
+            os.remove(cache)
+        return None
+
+
+def guardar_cache(cache, words, classes, train_x, train_y):
+    """Escribe la caché en un temporal y lo renombra, así nunca queda un .npz a medias"""
+    # las cachés de versiones anteriores (y temporales huérfanos) ya no se van a usar
+    for viejo in glob.glob('cache_*.npz') + glob.glob('cache_*.tmp'):
+        os.remove(viejo)
+    fd, temporal = tempfile.mkstemp(prefix='cache_', suffix='.tmp', dir=os.path.dirname(os.path.abspath(cache)))
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez_compressed(file, x=train_x, y=train_y, words=words, classes=classes)
+        os.replace(temporal, cache)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporal)
+        raise
+
+
+def main():
+    #Importamos el json
+    with open('intents.json', 'rb') as file: 
+        contenido = file.read()
+
+    # si intents.json y el preprocesamiento no cambiaron desde la última ejecución
+    # se reutilizan las matrices ya construidas y se evita todo el trabajo de NLTK/WordNet
+    clave = hashlib.sha1(f"v{PREPROCESS_VERSION}:".encode() + contenido).hexdigest()[:12]
+    cache = f"cache_{clave}.npz"
+    datos = cargar_cache(cache)
+    if datos is not None:
+        words, classes, train_x, train_y = datos
+    else:
+        intents = json.loads(contenido.decode('utf-8'))
+        words, classes, train_x, train_y = construir_datos(intents)
+        guardar_cache(cache, words, classes, train_x, train_y)
+
+    # Se guardan las palabras y clases en json, más rápido de cargar al predecir
+    with open('words.json', 'w', encoding='utf-8') as file:
+        json.dump(words, file, ensure_ascii=False)
+    with open('classes.json', 'w', encoding='utf-8') as file:
+        json.dump(classes, file, ensure_ascii=False)
+
+    # con GPU las capas ocultas calculan en float16 (tensor cores); en CPU se
+    # deja float32 porque sin soporte nativo bfloat16 se emula y es más lento
+    if tensorflow.config.list_physical_devices('GPU'):
+        mixed_precision.set_global_policy('mixed_float16')
+
+    # Creación del modelo apropieado
+    model = Sequential()  # instancia el modelo secuencial
+    model.add(Dense(128, input_shape=(train_x.shape[1],), activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(64, activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(len(classes), activation='softmax', dtype='float32'))  # softmax en float32 por estabilidad
+
+    # Lotes de 5 dejaban el paso dominado por el overhead de despacho de TF; con
+    # lotes de hasta 128 se amortiza ese costo fijo.
+    batch_size = min(128, len(train_x))
+
+    # AdamW converge en bastantes menos épocas que SGD para este clasificador
+    optimizer = AdamW(learning_rate=1e-3, weight_decay=1e-4)
+    # jit_compile fusiona la cadena Dense/Dropout/softmax en un solo cluster XLA por paso
+    model.compile(loss='sparse_categorical_crossentropy', optimizer=optimizer, metrics=['accuracy'], jit_compile=True)
+
+    # pipeline tf.data: se cachea en memoria, se baraja cada época y se prefetchea
+    # el siguiente lote mientras se entrena el actual.
+    # Cualquier .map() de preprocesamiento (casts, normalización) va después de
+    # .batch() para que se ejecute una vez por lote y no una vez por ejemplo.
+    dataset = (
+        tensorflow.data.Dataset.from_tensor_slices((train_x, train_y))
+        .cache()  # la caché guarda train_x en uint8, 4 veces menos que float32
+        .shuffle(len(train_x), seed=SEED, reshuffle_each_iteration=True)
+        .batch(batch_size, drop_remainder=False)
+        .map(lambda x, y: (tensorflow.cast(x, tensorflow.float32), y),
+             num_parallel_calls=tensorflow.data.AUTOTUNE)
+        .prefetch(tensorflow.data.AUTOTUNE)
+    )
+    # el dataset ya tiene su propia copia de los datos; se liberan las matrices
+    # de numpy antes de entrenar para no mantenerlas en memoria todas las épocas
+    del train_x, train_y
+    gc.collect()
+
+    # se detiene cuando la pérdida deja de bajar y se conservan los mejores pesos
+    early_stopping = EarlyStopping(monitor='loss', patience=5, restore_best_weights=True)
+    train_process = model.fit(dataset, epochs=50, callbacks=[early_stopping], verbose=1)
+
+    # guarda el modelo
+    model.save('chatbot_model.keras')
+    print("Model trained and saved successfully!")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,22 @@
 # Este código implementa un sistema que encuentra la mejor ruta entre un punto A y B
 # en un sistema de transporte masivo utilizando reglas lógicas y algoritmos de búsqueda
 
+import sys
+import math
 import heapq
 import datetime
 import json
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Set, Optional
 
+# Nombres de los días como aparecen en los horarios, indexados por weekday()
+DIAS_SEMANA = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+
+# slots=True (sin __dict__ por instancia) solo existe desde Python 3.10
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 # Definición de estructuras de datos
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Estacion:
     id: str
     nombre: str
@@ -17,7 +25,7 @@ class Estacion:
     lineas: List[str]                 # Lista de líneas que pasan por esta estación
     servicios: List[str]              # Servicios disponibles (baños, accesibilidad, etc.)
     
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Conexion:
     origen: str                       # ID de estación origen
     destino: str                      # ID de estación destino
@@ -26,14 +34,15 @@ class Conexion:
     distancia: float                  # Distancia en kilómetros
     activa: bool = True               # Indica si la conexión está activa
     horario: Optional[Dict] = None    # Horarios de operación por día de la semana
+    linea_id: int = -1                # Línea como entero, asignado al cargar la red
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Horario:
     hora_inicio: datetime.time
     hora_fin: datetime.time
     frecuencia: int                   # Frecuencia en minutos
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Ruta:
     estaciones: List[str]             # Lista de IDs de estaciones
     conexiones: List[str]             # Lista de IDs de conexiones
@@ -42,10 +51,24 @@ class Ruta:
     transbordos: int                  # Número de transbordos
     costo: float                      # Costo total del viaje
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class Preferencia:
     nombre: str
     peso: float                       # Peso entre 0 y 1
+
+RADIO_TIERRA_KM = 6371.0
+
+# Penalización de tiempo por transbordo (minutos) y costo fijo por conexión
+MINUTOS_TRANSBORDO = 5
+COSTO_CONEXION = 10
+
+def distancia_haversine(coord1, coord2):
+    """Calcula la distancia en kilómetros sobre la superficie terrestre entre dos coordenadas"""
+    lat1, lon1 = map(math.radians, coord1)
+    lat2, lon2 = map(math.radians, coord2)
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
     
 class BaseConocimiento:
     """Clase que gestiona la base de conocimiento del sistema"""
@@ -53,7 +76,40 @@ class BaseConocimiento:
     def __init__(self, archivo_reglas=None):
         self.estaciones: Dict[str, Estacion] = {}
         self.conexiones: Dict[str, Conexion] = {}
+        # Cada estación tiene un índice entero; la búsqueda trabaja con índices
+        self._indice_estacion: Dict[str, int] = {}
+        self._ids_estaciones: List[str] = []
+        self._coordenadas: List[Tuple[float, float]] = []
+        # (estaciones, conexiones) al construir los índices; si cambia, hay que rehacerlos
+        self._tamano_red: Tuple[int, int] = (0, 0)
+        # Distancia en línea recta entre los extremos de cada conexión
+        self._distancia_recta: Dict[str, float] = {}
+        # Mayor velocidad en línea recta (km/min) de las conexiones activas con
+        # sus tiempos actuales; acota por abajo el tiempo restante hasta el
+        # destino en la heurística de A*. Se recalcula en aplicar_reglas.
+        self._velocidad_maxima = 0.0
+        # Lista de adyacencia por índice de origen: [(índice destino, conexion, conexion_id)]
+        self.adyacencia: List[List[Tuple[int, Conexion, str]]] = []
+        # Lista de adyacencia inversa por índice de destino: [(índice origen, conexion, conexion_id)]
+        self.adyacencia_inversa: List[List[Tuple[int, Conexion, str]]] = []
+        # Solo conexiones activas tras aplicar_reglas, con los datos que usa la
+        # búsqueda: [(índice vecino, tiempo, distancia, línea, conexion_id)]
+        self.adyacencia_activa: List[List[Tuple[int, int, float, int, str]]] = []
+        # La inversa solo la usa la búsqueda bidireccional: se construye al pedirla
+        self.adyacencia_inversa_activa: Optional[List[List[Tuple[int, int, float, int, str]]]] = None
         self.reglas_logicas = []
+        # Estado original de las conexiones, para no acumular efectos de reglas
+        self._activa_base: Dict[str, bool] = {}
+        self._tiempo_base: Dict[str, int] = {}
+        # Horarios ya convertidos: conexion_id -> {día: (hora_inicio, hora_fin)}
+        self._horarios: Dict[str, Dict[str, Tuple[datetime.time, datetime.time]]] = {}
+        # Reglas lógicas agrupadas por tipo
+        self._estaciones_cerradas: Set[str] = set()
+        # Nombre de línea -> entero, para comparar líneas sin comparar textos
+        self._linea_a_entero: Dict[str, int] = {}
+        self._lineas_cerradas: Set[int] = set()
+        self._tramos_cerrados: Set[Tuple[str, str]] = set()
+        self._congestion_linea: Dict[int, float] = {}
         self.preferencias_default = [
             Preferencia("tiempo", 0.5),
             Preferencia("transbordos", 0.3),
@@ -94,71 +150,176 @@ class BaseConocimiento:
                     )
                     conexion_id = f"{conexion.origen}-{conexion.destino}-{conexion.linea}"
                     self.conexiones[conexion_id] = conexion
+                    self._activa_base[conexion_id] = conexion.activa
+                    self._tiempo_base[conexion_id] = conexion.tiempo_promedio
                 
                 # Cargar reglas lógicas
                 self.reglas_logicas = datos.get("reglas", [])
                 
+                # Indexar las estaciones y conexiones para la búsqueda
+                self._indexar_red()
+                
         except Exception as e:
             print(f"Error al cargar las reglas: {e}")
     
+    def _indexar_red(self):
+        """Reconstruye los índices enteros y las listas de adyacencia a partir de las estaciones y conexiones"""
+        self._indice_estacion = {}
+        self._ids_estaciones = []
+        self._coordenadas = []
+        for estacion_id, estacion in self.estaciones.items():
+            self._indice_estacion[estacion_id] = len(self._ids_estaciones)
+            self._ids_estaciones.append(estacion_id)
+            self._coordenadas.append(estacion.coordenadas)
+        
+        # Indexar las conexiones por estación de origen para la búsqueda
+        self.adyacencia = [[] for _ in self._ids_estaciones]
+        self.adyacencia_inversa = [[] for _ in self._ids_estaciones]
+        self._distancia_recta = {}
+        for conexion_id, conexion in self.conexiones.items():
+            conexion.linea_id = self._linea_a_entero.setdefault(conexion.linea, len(self._linea_a_entero))
+            if conexion.horario and conexion_id not in self._horarios:
+                self._horarios[conexion_id] = {
+                    dia: (datetime.time(*horario_dia["inicio"]), datetime.time(*horario_dia["fin"]))
+                    for dia, horario_dia in conexion.horario.items()
+                }
+            
+            indice_origen = self._indice_estacion.get(conexion.origen)
+            indice_destino = self._indice_estacion.get(conexion.destino)
+            # Una conexión con un extremo sin definir no puede recorrerse
+            if indice_origen is None or indice_destino is None:
+                print(f"Conexión {conexion_id} ignorada: estación no definida")
+                continue
+            self.adyacencia[indice_origen].append((indice_destino, conexion, conexion_id))
+            self.adyacencia_inversa[indice_destino].append((indice_origen, conexion, conexion_id))
+            self._distancia_recta[conexion_id] = distancia_haversine(
+                self._coordenadas[indice_origen], self._coordenadas[indice_destino])
+        
+        # Hasta la primera llamada a aplicar_reglas se busca sobre el estado cargado
+        self.adyacencia_activa = self._filtrar_activas(self.adyacencia)
+        self.adyacencia_inversa_activa = None
+        self._tamano_red = (len(self.estaciones), len(self.conexiones))
+    
     def aplicar_reglas(self, origen, destino, hora_actual=None, preferencias=None):
         """Aplica las reglas lógicas para modificar la red antes de la búsqueda"""
         
         # Si no se proporciona hora, usar la hora actual
         if hora_actual is None:
             hora_actual = datetime.datetime.now()
+        dia_semana = DIAS_SEMANA[hora_actual.weekday()]
+        hora = hora_actual.time()
         
-        # Aplicar reglas de horario
-        for conexion_id, conexion in list(self.conexiones.items()):
+        # Rehacer los índices si se agregaron estaciones o conexiones después de la carga
+        if self._tamano_red != (len(self.estaciones), len(self.conexiones)):
+            self._indexar_red()
+        
+        # Reagrupar las reglas en cada llamada: reglas_logicas es pública y
+        # puede haber cambiado desde la carga
+        self._indexar_reglas()
+        
+        # Aplicar reglas de horario y reglas lógicas en una sola pasada,
+        # partiendo siempre del estado original de cada conexión. Una conexión
+        # agregada a self.conexiones después de la carga toma como estado
+        # original el que tenga en ese momento.
+        velocidad_maxima = 0.0
+        for conexion_id, conexion in self.conexiones.items():
+            activa_base = self._activa_base.setdefault(conexion_id, conexion.activa)
+            tiempo_base = self._tiempo_base.setdefault(conexion_id, conexion.tiempo_promedio)
+            conexion.activa = (
+                activa_base
+                and conexion.origen not in self._estaciones_cerradas
+                and conexion.destino not in self._estaciones_cerradas
+                and conexion.linea_id not in self._lineas_cerradas
+                and (conexion.origen, conexion.destino) not in self._tramos_cerrados
+            )
+            
+            # Ajustar el tiempo de viaje según la congestión
+            conexion.tiempo_promedio = int(
+                tiempo_base * self._congestion_linea.get(conexion.linea_id, 1.0))
+            
             if not conexion.activa:
                 continue
                 
             # Verificar si la conexión tiene horario específico
-            if conexion.horario:
-                dia_semana = hora_actual.strftime("%A").lower()
-                if dia_semana in conexion.horario:
-                    horario_dia = conexion.horario[dia_semana]
-                    hora_inicio = datetime.time(horario_dia["inicio"][0], horario_dia["inicio"][1])
-                    hora_fin = datetime.time(horario_dia["fin"][0], horario_dia["fin"][1])
-                    
-                    # Si estamos fuera del horario, desactivar temporalmente la conexión
-                    if hora_actual.time() < hora_inicio or hora_actual.time() > hora_fin:
-                        conexion.activa = False
+            horario = self._horarios.get(conexion_id)
+            if horario and dia_semana in horario:
+                hora_inicio, hora_fin = horario[dia_semana]
+                
+                # Si estamos fuera del horario, desactivar temporalmente la conexión
+                if hora < hora_inicio or hora > hora_fin:
+                    conexion.activa = False
+                    continue
+            
+            # La cota de la heurística usa el tiempo ya modificado por las reglas:
+            # una congestión con factor < 1 o un tiempo truncado a 0 la suben.
+            # Una conexión sin tiempo permite velocidad ilimitada: sin cota útil.
+            distancia_recta = self._distancia_recta.get(conexion_id)
+            if distancia_recta is not None:
+                velocidad = (distancia_recta / conexion.tiempo_promedio
+                             if conexion.tiempo_promedio > 0 else float('inf'))
+                velocidad_maxima = max(velocidad_maxima, velocidad)
+        
+        self._velocidad_maxima = velocidad_maxima
+        
+        # Dejar en las listas de la búsqueda solo las conexiones activas
+        self.adyacencia_activa = self._filtrar_activas(self.adyacencia)
+        self.adyacencia_inversa_activa = None
+    
+    @staticmethod
+    def _filtrar_activas(adyacencia):
+        """Copia una lista de adyacencia conservando solo las conexiones activas"""
+        return [
+            [(vecino, conexion.tiempo_promedio, conexion.distancia, conexion.linea_id, conexion_id)
+             for vecino, conexion, conexion_id in vecinos if conexion.activa]
+            for vecinos in adyacencia
+        ]
+    
+    def _indexar_reglas(self):
+        """Agrupa las reglas lógicas por tipo para aplicarlas en una sola pasada"""
+        self._estaciones_cerradas = set()
+        self._lineas_cerradas = set()
+        self._tramos_cerrados = set()
+        self._congestion_linea = {}
         
-        # Aplicar reglas lógicas específicas
         for regla in self.reglas_logicas:
             tipo_regla = regla.get("tipo")
             
             if tipo_regla == "cierre_estacion":
                 estacion_id = regla.get("estacion_id")
                 if estacion_id in self.estaciones:
-                    # Desactivar todas las conexiones que involucren esta estación
-                    for conexion_id, conexion in self.conexiones.items():
-                        if conexion.origen == estacion_id or conexion.destino == estacion_id:
-                            conexion.activa = False
+                    self._estaciones_cerradas.add(estacion_id)
             
             elif tipo_regla == "cierre_linea":
-                linea = regla.get("linea")
-                # Desactivar todas las conexiones de esta línea
-                for conexion_id, conexion in self.conexiones.items():
-                    if conexion.linea == linea:
-                        conexion.activa = False
+                # Una línea sin conexiones no tiene nada que cerrar
+                linea_id = self._linea_a_entero.get(regla.get("linea"))
+                if linea_id is not None:
+                    self._lineas_cerradas.add(linea_id)
             
             elif tipo_regla == "mantenimiento_tramo":
+                # El tramo se cierra en ambos sentidos
                 tramo_origen = regla.get("origen")
                 tramo_destino = regla.get("destino")
-                for conexion_id, conexion in self.conexiones.items():
-                    if (conexion.origen == tramo_origen and conexion.destino == tramo_destino) or \
-                       (conexion.origen == tramo_destino and conexion.destino == tramo_origen):
-                        conexion.activa = False
+                self._tramos_cerrados.add((tramo_origen, tramo_destino))
+                self._tramos_cerrados.add((tramo_destino, tramo_origen))
             
             elif tipo_regla == "congestion":
-                linea = regla.get("linea")
+                linea_id = self._linea_a_entero.get(regla.get("linea"))
                 factor = regla.get("factor", 1.5)
-                for conexion_id, conexion in self.conexiones.items():
-                    if conexion.linea == linea:
-                        # Aumentar el tiempo de viaje debido a la congestión
-                        conexion.tiempo_promedio = int(conexion.tiempo_promedio * factor)
+                if linea_id is not None:
+                    self._congestion_linea[linea_id] = self._congestion_linea.get(linea_id, 1.0) * factor
+
+class _FronteraBusqueda:
+    """Estado de uno de los dos sentidos de la búsqueda bidireccional"""
+    
+    def __init__(self, inicio, adyacencia):
+        estado_inicial = (inicio, -1)
+        self.adyacencia = adyacencia
+        self.cola = [(0, 0, inicio, -1)]          # (costo, contador, estación, línea)
+        self.contador = 0
+        self.g_score = {estado_inicial: 0}
+        self.metricas = {estado_inicial: (0, 0, 0, 0)}
+        self.padres = {}
+        self.etiquetas = {inicio: {-1: 0}}       # estación -> {línea: costo}
 
 class SistemaRutas:
     """Clase principal del sistema de rutas"""
@@ -166,7 +327,7 @@ class SistemaRutas:
     def __init__(self, base_conocimiento):
         self.base_conocimiento = base_conocimiento
     
-    def calcular_ruta(self, origen_id, destino_id, hora=None, preferencias=None):
+    def calcular_ruta(self, origen_id, destino_id, hora=None, preferencias=None, bidireccional=False):
         """
         Calcula la mejor ruta entre dos estaciones
         
@@ -175,6 +336,7 @@ class SistemaRutas:
             destino_id: ID de la estación de destino
             hora: Hora de salida (datetime)
             preferencias: Lista de preferencias del usuario
+            bidireccional: Buscar simultáneamente desde el origen y el destino
             
         Returns:
             Mejor ruta encontrada
@@ -186,10 +348,22 @@ class SistemaRutas:
         if preferencias is None:
             preferencias = self.base_conocimiento.preferencias_default
         
+        # Convertir las preferencias en un vector de pesos una sola vez
+        pesos = {pref.nombre: pref.peso for pref in preferencias}
+        vector_pesos = (
+            pesos.get("tiempo", 0),
+            pesos.get("distancia", 0),
+            pesos.get("transbordos", 0),
+            pesos.get("costo", 0)
+        )
+        
+        if bidireccional:
+            return self._buscar_ruta_bidireccional(origen_id, destino_id, vector_pesos)
+        
         # Implementar algoritmo A* para encontrar la mejor ruta
-        return self._buscar_ruta_astar(origen_id, destino_id, preferencias)
+        return self._buscar_ruta_astar(origen_id, destino_id, vector_pesos)
     
-    def _buscar_ruta_astar(self, origen_id, destino_id, preferencias):
+    def _buscar_ruta_astar(self, origen_id, destino_id, pesos):
         """Implementa el algoritmo A* para encontrar la mejor ruta"""
         
         # Validar que las estaciones existan
@@ -199,187 +373,254 @@ class SistemaRutas:
             raise ValueError(f"La estación de destino {destino_id} no existe")
             
         # Obtener coordenadas de destino para la heurística
-        destino = self.base_conocimiento.estaciones[destino_id]
-        destino_coords = destino.coordenadas
+        destino_coords = self.base_conocimiento.estaciones[destino_id].coordenadas
+        
+        # Heurística de todas las estaciones calculada una vez por búsqueda:
+        # tiempo mínimo posible hasta el destino viajando en línea recta a la
+        # mayor velocidad de la red, ponderado como el tiempo en el costo.
+        # Nunca sobreestima el costo real, así que A* sigue siendo óptimo.
+        velocidad_maxima = self.base_conocimiento._velocidad_maxima
+        if 0 < velocidad_maxima < float('inf'):
+            factor_heuristica = pesos[0] / velocidad_maxima
+        else:
+            factor_heuristica = 0
+        heuristicas = [factor_heuristica * distancia_haversine(coordenadas, destino_coords)
+                       for coordenadas in self.base_conocimiento._coordenadas]
+        
+        # Trabajar con índices enteros de estación en lugar de IDs de texto
+        origen = self.base_conocimiento._indice_estacion[origen_id]
+        destino = self.base_conocimiento._indice_estacion[destino_id]
+        adyacencia = self.base_conocimiento.adyacencia_activa
         
         # Inicialización de estructuras para A*
-        cola_prioridad = []  # Cola de prioridad (heap)
-        visitados = set()    # Conjunto de nodos visitados
+        # Cada estado es (estación, línea con la que se llegó): el costo de la
+        # siguiente conexión depende de la línea por los transbordos
+        cola_prioridad = []  # Cola de prioridad (heap) con borrado perezoso
+        contador = 0         # Desempate determinista entre prioridades iguales
         
         # Estructura para rastrear el camino y acumular métricas
+        estado_inicial = (origen, -1)  # -1: todavía sin línea
         padres = {}  # Para reconstruir el camino
-        lineas_actuales = {}  # Para rastrear la línea actual y detectar transbordos
+        g_score = {estado_inicial: 0}  # Costo ponderado acumulado de cada estado
         metricas = {
-            # Para cada estación guardamos: (tiempo, distancia, transbordos, costo)
-            origen_id: (0, 0, 0, 0)
+            # Para cada estado guardamos: (tiempo, distancia, transbordos, costo)
+            estado_inicial: (0, 0, 0, 0)
         }
         
         # Agregar nodo inicial a la cola de prioridad
-        # (prioridad, estación, línea_actual)
-        heapq.heappush(cola_prioridad, (0, origen_id, None))
+        # (prioridad, costo acumulado, contador, estación, línea_actual)
+        heapq.heappush(cola_prioridad, (0, 0, contador, origen, -1))
         
         while cola_prioridad:
             # Obtener el nodo con menor prioridad
-            _, estacion_actual_id, linea_actual = heapq.heappop(cola_prioridad)
+            _, g_actual, _, estacion_actual, linea_actual = heapq.heappop(cola_prioridad)
+            estado_actual = (estacion_actual, linea_actual)
             
-            # Si ya visitamos esta estación, continuar
-            if estacion_actual_id in visitados:
+            # Entrada obsoleta: el estado ya se alcanzó después con menor costo
+            if g_actual > g_score[estado_actual]:
                 continue
-                
-            # Marcar como visitado
-            visitados.add(estacion_actual_id)
             
             # Si llegamos al destino, reconstruir y devolver la ruta
-            if estacion_actual_id == destino_id:
-                return self._reconstruir_ruta(padres, origen_id, destino_id, metricas)
+            if estacion_actual == destino:
+                return self._reconstruir_ruta(padres, estado_actual, metricas)
             
-            # Explorar conexiones desde la estación actual
-            for conexion_id, conexion in self.base_conocimiento.conexiones.items():
-                if not conexion.activa:
-                    continue
-                    
-                if conexion.origen == estacion_actual_id:
-                    estacion_siguiente_id = conexion.destino
-                    
-                    # Si ya visitamos esta estación, continuar
-                    if estacion_siguiente_id in visitados:
-                        continue
-                    
-                    # Calcular métricas para esta conexión
-                    tiempo_actual, distancia_actual, transbordos_actual, costo_actual = metricas[estacion_actual_id]
-                    
-                    # Tiempo adicional
-                    tiempo_adicional = conexion.tiempo_promedio
-                    
-                    # Distancia adicional
-                    distancia_adicional = conexion.distancia
-                    
-                    # Transbordos: incrementar si cambiamos de línea
-                    transbordos_adicional = 0
-                    if linea_actual is not None and linea_actual != conexion.linea:
-                        transbordos_adicional = 1
-                        # Agregar penalización de tiempo por transbordo (5 minutos)
-                        tiempo_adicional += 5
+            metricas_actual = metricas[estado_actual]
+            
+            # Explorar solo las conexiones que salen de la estación actual
+            for estacion_siguiente, tiempo, distancia, linea, conexion_id in adyacencia[estacion_actual]:
+                estado_siguiente = (estacion_siguiente, linea)
+                
+                # Transbordo si cambiamos de línea
+                transbordo = linea_actual >= 0 and linea_actual != linea
+                
+                # Actualizar métricas acumuladas
+                metricas_nuevas = self._metricas_tramo(metricas_actual, tiempo, distancia, transbordo)
+                g_nuevo = self._calcular_costo(metricas_nuevas, pesos)
+                
+                # Relajar solo si mejora el costo acumulado del estado
+                if g_nuevo < g_score.get(estado_siguiente, float('inf')):
+                    g_score[estado_siguiente] = g_nuevo
+                    metricas[estado_siguiente] = metricas_nuevas
                     
-                    # Costo adicional (ejemplo simple: 10 unidades por conexión)
-                    costo_adicional = 10
+                    # Actualizar padre para reconstruir ruta
+                    padres[estado_siguiente] = (estado_actual, conexion_id)
                     
-                    # Actualizar métricas acumuladas
-                    tiempo_nuevo = tiempo_actual + tiempo_adicional
-                    distancia_nueva = distancia_actual + distancia_adicional
-                    transbordos_nuevos = transbordos_actual + transbordos_adicional
-                    costo_nuevo = costo_actual + costo_adicional
+                    # Heurística: costo mínimo restante hasta el destino
+                    heuristica = heuristicas[estacion_siguiente]
                     
-                    # Si es una mejor ruta o no hemos visitado esta estación
-                    if estacion_siguiente_id not in metricas or self._es_mejor_ruta(
-                            (tiempo_nuevo, distancia_nueva, transbordos_nuevos, costo_nuevo),
-                            metricas.get(estacion_siguiente_id, (float('inf'), float('inf'), float('inf'), float('inf'))),
-                            preferencias):
-                        
-                        # Actualizar métricas
-                        metricas[estacion_siguiente_id] = (tiempo_nuevo, distancia_nueva, transbordos_nuevos, costo_nuevo)
-                        
-                        # Actualizar padre para reconstruir ruta
-                        padres[estacion_siguiente_id] = (estacion_actual_id, conexion_id)
-                        
-                        # Actualizar línea actual
-                        lineas_actuales[estacion_siguiente_id] = conexion.linea
-                        
-                        # Calcular heurística (distancia directa al destino)
-                        estacion_siguiente = self.base_conocimiento.estaciones[estacion_siguiente_id]
-                        heuristica = self._calcular_distancia(estacion_siguiente.coordenadas, destino_coords)
-                        
-                        # Calcular prioridad combinando métricas actuales y heurística
-                        prioridad = self._calcular_prioridad(
-                            (tiempo_nuevo, distancia_nueva, transbordos_nuevos, costo_nuevo),
-                            heuristica,
-                            preferencias
-                        )
-                        
-                        # Agregar a la cola de prioridad
-                        heapq.heappush(cola_prioridad, (prioridad, estacion_siguiente_id, conexion.linea))
+                    # Agregar a la cola de prioridad
+                    contador += 1
+                    heapq.heappush(cola_prioridad, (
+                        self._calcular_prioridad(g_nuevo, heuristica),
+                        g_nuevo, contador, estacion_siguiente, linea
+                    ))
         
         # Si no se encontró ruta
         return None
     
-    def _es_mejor_ruta(self, metricas_nueva, metricas_actual, preferencias):
-        """Determina si una ruta es mejor que otra según las preferencias"""
-        # Desempaquetar métricas
-        tiempo_nuevo, distancia_nueva, transbordos_nuevos, costo_nuevo = metricas_nueva
-        tiempo_actual, distancia_actual, transbordos_actual, costo_actual = metricas_actual
-        
-        # Normalizar y ponderar según preferencias
-        valor_nuevo = 0
-        valor_actual = 0
-        
-        for pref in preferencias:
-            if pref.nombre == "tiempo":
-                valor_nuevo += pref.peso * tiempo_nuevo
-                valor_actual += pref.peso * tiempo_actual
-            elif pref.nombre == "distancia":
-                valor_nuevo += pref.peso * distancia_nueva
-                valor_actual += pref.peso * distancia_actual
-            elif pref.nombre == "transbordos":
-                valor_nuevo += pref.peso * transbordos_nuevos * 10  # Multiplicamos para dar más peso
-                valor_actual += pref.peso * transbordos_actual * 10
-            elif pref.nombre == "costo":
-                valor_nuevo += pref.peso * costo_nuevo
-                valor_actual += pref.peso * costo_actual
-        
-        # Menor valor es mejor
-        return valor_nuevo < valor_actual
+    def _buscar_ruta_bidireccional(self, origen_id, destino_id, pesos):
+        """
+        Busca la mejor ruta avanzando desde el origen y retrocediendo desde el
+        destino a la vez (costo uniforme, sin heurística). Termina cuando la
+        suma de los menores costos de ambas fronteras no puede mejorar la
+        mejor ruta encontrada a través de una estación común.
+        """
+        
+        # Validar que las estaciones existan
+        if origen_id not in self.base_conocimiento.estaciones:
+            raise ValueError(f"La estación de origen {origen_id} no existe")
+        if destino_id not in self.base_conocimiento.estaciones:
+            raise ValueError(f"La estación de destino {destino_id} no existe")
+        
+        origen = self.base_conocimiento._indice_estacion[origen_id]
+        destino = self.base_conocimiento._indice_estacion[destino_id]
+        
+        # La lista inversa de conexiones activas se filtra solo cuando se necesita
+        if self.base_conocimiento.adyacencia_inversa_activa is None:
+            self.base_conocimiento.adyacencia_inversa_activa = self.base_conocimiento._filtrar_activas(
+                self.base_conocimiento.adyacencia_inversa)
+        
+        # Hacia adelante el estado es (estación, línea con la que se llegó);
+        # hacia atrás es (estación, línea con la que se sale)
+        ida = _FronteraBusqueda(origen, self.base_conocimiento.adyacencia_activa)
+        vuelta = _FronteraBusqueda(destino, self.base_conocimiento.adyacencia_inversa_activa)
+        
+        # Costo de un transbordo en la estación de encuentro
+        penalizacion = self._calcular_costo(self._metricas_tramo((0, 0, 0, 0), 0, 0, True, conexiones=0), pesos)
+        
+        mejor_costo = float('inf')
+        encuentro = None
+        if origen == destino:
+            mejor_costo, encuentro = 0, ((origen, -1), (destino, -1))
+        
+        # Alternar una expansión hacia adelante y una hacia atrás
+        turno_ida = True
+        while ida.cola and vuelta.cola and ida.cola[0][0] + vuelta.cola[0][0] < mejor_costo:
+            if turno_ida:
+                candidato = self._expandir_frontera(ida, vuelta, pesos, penalizacion)
+                if candidato and candidato[0] < mejor_costo:
+                    mejor_costo, encuentro = candidato[0], (candidato[1], candidato[2])
+            else:
+                candidato = self._expandir_frontera(vuelta, ida, pesos, penalizacion)
+                if candidato and candidato[0] < mejor_costo:
+                    mejor_costo, encuentro = candidato[0], (candidato[2], candidato[1])
+            turno_ida = not turno_ida
+        
+        # Si no se encontró ruta
+        if encuentro is None:
+            return None
+        
+        # Unir la mitad de ida con la mitad de vuelta en la estación de encuentro
+        estado_ida, estado_vuelta = encuentro
+        ruta = self._reconstruir_ruta(ida.padres, estado_ida, ida.metricas)
+        ids_estaciones = self.base_conocimiento._ids_estaciones
+        estado_actual = estado_vuelta
+        while estado_actual in vuelta.padres:
+            estado_actual, conexion_id = vuelta.padres[estado_actual]
+            ruta.conexiones.append(conexion_id)
+            ruta.estaciones.append(ids_estaciones[estado_actual[0]])
+        
+        transbordo = estado_ida[1] >= 0 and estado_vuelta[1] >= 0 and estado_ida[1] != estado_vuelta[1]
+        tiempo, distancia, transbordos, costo = self._metricas_tramo(
+            vuelta.metricas[estado_vuelta], 0, 0, transbordo, conexiones=0)
+        ruta.tiempo_total += tiempo
+        ruta.distancia_total += distancia
+        ruta.transbordos += transbordos
+        ruta.costo += costo
+        
+        return ruta
+    
+    def _expandir_frontera(self, frontera, opuesta, pesos, penalizacion):
+        """
+        Expande el siguiente estado de una frontera de la búsqueda bidireccional
+        
+        Returns:
+            (costo, estado propio, estado opuesto) del mejor encuentro con la
+            frontera opuesta descubierto en esta expansión, o None
+        """
+        g_actual, _, estacion_actual, linea_actual = heapq.heappop(frontera.cola)
+        estado_actual = (estacion_actual, linea_actual)
+        
+        # Entrada obsoleta: el estado ya se alcanzó después con menor costo
+        if g_actual > frontera.g_score[estado_actual]:
+            return None
+        
+        metricas_actual = frontera.metricas[estado_actual]
+        mejor = None
+        
+        for estacion_siguiente, tiempo, distancia, linea, conexion_id in frontera.adyacencia[estacion_actual]:
+            # Transbordos y su penalización de tiempo, igual que en A*
+            transbordo = linea_actual >= 0 and linea_actual != linea
+            metricas_nuevas = self._metricas_tramo(metricas_actual, tiempo, distancia, transbordo)
+            g_nuevo = self._calcular_costo(metricas_nuevas, pesos)
+            estado_siguiente = (estacion_siguiente, linea)
+            
+            if g_nuevo < frontera.g_score.get(estado_siguiente, float('inf')):
+                frontera.g_score[estado_siguiente] = g_nuevo
+                frontera.metricas[estado_siguiente] = metricas_nuevas
+                frontera.padres[estado_siguiente] = (estado_actual, conexion_id)
+                frontera.etiquetas.setdefault(estacion_siguiente, {})[linea] = g_nuevo
+                frontera.contador += 1
+                heapq.heappush(frontera.cola, (g_nuevo, frontera.contador, estacion_siguiente, linea))
+                
+                # Ruta completa si la otra frontera ya alcanzó esta estación
+                for linea_opuesta, g_opuesto in opuesta.etiquetas.get(estacion_siguiente, {}).items():
+                    total = g_nuevo + g_opuesto
+                    if linea_opuesta >= 0 and linea_opuesta != linea:
+                        total += penalizacion
+                    if mejor is None or total < mejor[0]:
+                        mejor = (total, estado_siguiente, (estacion_siguiente, linea_opuesta))
+        
+        return mejor
+    
+    def _metricas_tramo(self, metricas, tiempo, distancia, transbordo, conexiones=1):
+        """Suma a las métricas acumuladas las de recorrer una conexión, con su transbordo si lo hay"""
+        tiempo_actual, distancia_actual, transbordos_actual, costo_actual = metricas
+        return (
+            tiempo_actual + tiempo + (MINUTOS_TRANSBORDO if transbordo else 0),
+            distancia_actual + distancia,
+            transbordos_actual + (1 if transbordo else 0),
+            costo_actual + COSTO_CONEXION * conexiones
+        )
     
-    def _calcular_prioridad(self, metricas, heuristica, preferencias):
-        """Calcula la prioridad para A* combinando métricas actuales y heurística"""
+    def _calcular_costo(self, metricas, pesos):
+        """Combina las métricas acumuladas en un costo único según el vector de pesos"""
         tiempo, distancia, transbordos, costo = metricas
+        peso_tiempo, peso_distancia, peso_transbordos, peso_costo = pesos
         
-        # Normalizar y ponderar según preferencias
-        valor = 0
-        
-        for pref in preferencias:
-            if pref.nombre == "tiempo":
-                valor += pref.peso * tiempo
-            elif pref.nombre == "distancia":
-                valor += pref.peso * distancia
-            elif pref.nombre == "transbordos":
-                valor += pref.peso * transbordos * 10  # Multiplicamos para dar más peso
-            elif pref.nombre == "costo":
-                valor += pref.peso * costo
-        
-        # Sumar heurística (distancia directa al destino)
-        # Usando un factor para convertir distancia a una unidad comparable
-        factor_heuristica = 2  # Ajustar según sea necesario
-        return valor + heuristica * factor_heuristica
+        # Multiplicamos los transbordos para darles más peso
+        return (peso_tiempo * tiempo + peso_distancia * distancia +
+                peso_transbordos * transbordos * 10 + peso_costo * costo)
     
-    def _calcular_distancia(self, coord1, coord2):
-        """Calcula la distancia euclidiana entre dos coordenadas"""
-        lat1, lon1 = coord1
-        lat2, lon2 = coord2
-        return ((lat2 - lat1) ** 2 + (lon2 - lon1) ** 2) ** 0.5
+    def _calcular_prioridad(self, costo, heuristica):
+        """Calcula la prioridad para A* combinando el costo acumulado y la heurística"""
+        # La heurística ya está en las mismas unidades que el costo
+        return costo + heuristica
     
-    def _reconstruir_ruta(self, padres, origen_id, destino_id, metricas):
+    def _reconstruir_ruta(self, padres, estado_final, metricas):
         """Reconstruye la ruta completa a partir de los nodos padre"""
+        ids_estaciones = self.base_conocimiento._ids_estaciones
         estaciones = []
         conexiones = []
         
-        estacion_actual = destino_id
+        estado_actual = estado_final
         
         # Reconstruir el camino desde el destino hasta el origen
-        while estacion_actual != origen_id:
-            estaciones.append(estacion_actual)
-            estacion_anterior, conexion_id = padres[estacion_actual]
+        while estado_actual in padres:
+            estaciones.append(ids_estaciones[estado_actual[0]])
+            estado_anterior, conexion_id = padres[estado_actual]
             conexiones.append(conexion_id)
-            estacion_actual = estacion_anterior
+            estado_actual = estado_anterior
         
         # Agregar el origen
-        estaciones.append(origen_id)
+        estaciones.append(ids_estaciones[estado_actual[0]])
         
         # Invertir las listas para que vayan del origen al destino
         estaciones.reverse()
         conexiones.reverse()
         
         # Obtener métricas finales
-        tiempo_total, distancia_total, transbordos, costo = metricas[destino_id]
+        tiempo_total, distancia_total, transbordos, costo = metricas[estado_final]
         
         # Crear objeto Ruta
         ruta = Ruta(
@@ -398,40 +639,43 @@ class SistemaRutas:
         if not ruta:
             return "No se encontró una ruta válida."
         
-        descripcion = []
-        descripcion.append(f"Ruta con {len(ruta.estaciones)} estaciones:")
-        descripcion.append(f"- Tiempo total: {ruta.tiempo_total} minutos")
-        descripcion.append(f"- Distancia total: {ruta.distancia_total:.2f} km")
-        descripcion.append(f"- Transbordos: {ruta.transbordos}")
-        descripcion.append(f"- Costo: {ruta.costo} unidades")
-        descripcion.append("\nInstrucciones paso a paso:")
+        estaciones = self.base_conocimiento.estaciones
+        conexiones = self.base_conocimiento.conexiones
+        
+        descripcion = [
+            f"Ruta con {len(ruta.estaciones)} estaciones:",
+            f"- Tiempo total: {ruta.tiempo_total} minutos",
+            f"- Distancia total: {ruta.distancia_total:.2f} km",
+            f"- Transbordos: {ruta.transbordos}",
+            f"- Costo: {ruta.costo} unidades",
+            "\nInstrucciones paso a paso:"
+        ]
         
         linea_actual = None
+        ultimo_tramo = len(ruta.estaciones) - 2
         
-        for i in range(len(ruta.estaciones) - 1):
-            estacion_actual_id = ruta.estaciones[i]
-            estacion_siguiente_id = ruta.estaciones[i + 1]
-            conexion_id = ruta.conexiones[i]
-            
-            estacion_actual = self.base_conocimiento.estaciones[estacion_actual_id]
-            estacion_siguiente = self.base_conocimiento.estaciones[estacion_siguiente_id]
-            conexion = self.base_conocimiento.conexiones[conexion_id]
+        tramos = zip(ruta.estaciones, ruta.estaciones[1:], ruta.conexiones)
+        for i, (estacion_actual_id, estacion_siguiente_id, conexion_id) in enumerate(tramos):
+            estacion_actual = estaciones[estacion_actual_id]
+            estacion_siguiente = estaciones[estacion_siguiente_id]
+            linea = conexiones[conexion_id].linea
             
             # Si es la primera estación
             if i == 0:
                 descripcion.append(f"1. Inicia en la estación {estacion_actual.nombre}.")
-                descripcion.append(f"   Toma la línea {conexion.linea} en dirección a {estacion_siguiente.nombre}.")
-                linea_actual = conexion.linea
+                descripcion.append(f"   Toma la línea {linea} en dirección a {estacion_siguiente.nombre}.")
+                linea_actual = linea
+                continue
+            
+            # Verificar si hay transbordo
+            if linea != linea_actual:
+                descripcion.append(f"{i+1}. En la estación {estacion_actual.nombre}, transborda a la línea {linea}.")
+                linea_actual = linea
+            
+            # Si es la penúltima estación
+            if i == ultimo_tramo:
+                descripcion.append(f"{i+2}. Llega a tu destino: estación {estacion_siguiente.nombre}.")
             else:
-                # Verificar si hay transbordo
-                if conexion.linea != linea_actual:
-                    descripcion.append(f"{i+1}. En la estación {estacion_actual.nombre}, transborda a la línea {conexion.linea}.")
-                    linea_actual = conexion.linea
-                
-                # Si es la penúltima estación
-                if i == len(ruta.estaciones) - 2:
-                    descripcion.append(f"{i+2}. Llega a tu destino: estación {estacion_siguiente.nombre}.")
-                else:
-                    descripcion.append(f"{i+1}. Continúa en la línea {conexion.linea} hasta la estación {estacion_siguiente.nombre}.")
+                descripcion.append(f"{i+1}. Continúa en la línea {linea} hasta la estación {estacion_siguiente.nombre}.")
         
-        return "\n".join(descripcion)
\ No newline at end of file
+        return "\n".join(descripcion)